@@ -14,6 +14,10 @@ export interface CategoryMatch {
   matchedKeywords: string[];
 }
 
+function escapeRegExp(value: string): string {
+  return value.replace(/[.*+?^${}()|[\]\\]/g, '\\$&');
+}
+
 export class CategoryService {
 
   // Comprehensive category mapping based on official datasets
@@ -259,6 +263,16 @@ export class CategoryService {
     }
   };
 
+  // One precompiled alternation per category. A single scan tells us whether
+  // any keyword of the category occurs, so categories without a hit skip the
+  // per-keyword loop entirely.
+  private readonly categoryPatterns: Record<string, RegExp> = Object.fromEntries(
+    Object.entries(this.categoryKeywords).map(([category, data]) => [
+      category,
+      new RegExp(data.keywords.map(keyword => escapeRegExp(keyword.toLowerCase())).join('|'))
+    ])
+  );
+
   /**
    * Classify text into product categories
    */
@@ -267,6 +281,10 @@ export class CategoryService {
     const matches: CategoryMatch[] = [];
 
     for (const [category, data] of Object.entries(this.categoryKeywords)) {
+      if (!this.categoryPatterns[category].test(textLower)) {
+        continue;
+      }
+
       const matchedKeywords: string[] = [];
       let totalMatches = 0;
 
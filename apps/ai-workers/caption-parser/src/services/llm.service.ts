@@ -1,4 +1,6 @@
 import axios from 'axios';
+import * as http from 'http';
+import * as https from 'https';
 import { LLMResponse, ParsedCaptionData } from '../types';
 import { CategoryService } from './category.service';
 
@@ -25,6 +27,32 @@ class Logger {
   }
 }
 
+// Shared HTTP client for LLM calls. Node 18 does not keep sockets alive by
+// default, so every caption would otherwise pay a fresh TCP + TLS handshake.
+const httpClient = axios.create({
+  httpAgent: new http.Agent({ keepAlive: true, maxSockets: 16 }),
+  httpsAgent: new https.Agent({ keepAlive: true, maxSockets: 16 })
+});
+
+// Fallback parsing tables, built once at module load rather than per caption
+const PRICE_PATTERNS: ReadonlyArray<{ pattern: RegExp; multiplier: number }> = [
+  { pattern: /(\d+(?:\.\d+)?)\s*m\b/i, multiplier: 1000000 },  // "2.5m" format
+  { pattern: /(\d+(?:\.\d+)?)\s*k\b/i, multiplier: 1000 },  // "55k" format
+  { pattern: /(\d+(?:,\d{3})*)\s*(?:ugx|shillings?)\b/i, multiplier: 1 },  // "55,000 UGX" format
+  { pattern: /(\d+(?:,\d{3})*)\s*(?:only|price|cost)/i, multiplier: 1 }    // "55,000 only" format
+];
+
+const SIZE_PATTERNS: ReadonlyArray<RegExp> = [
+  /sizes?\s*:?\s*([^,\n.!?]+)/i,  // "sizes: 37-41" or "size: Large"
+  /(\d+(?:\s*[-–—]\s*\d+)?)\s*(?:size|inch|gb|tb|bedroom|year)/i,  // "256GB", "3 bedroom", "2018 year"
+  /model\s+(\d{4})/i,  // "model 2018"
+  /(\d+)\s*(?:bedroom|room)/i,  // "3 bedroom"
+];
+
+const TITLE_STOPWORDS: ReadonlySet<string> = new Set([
+  'only', 'new', 'available', 'sizes', 'price', 'ugx', 'shillings', 'call', 'contact', 'dm'
+]);
+
 export class LLMService {
   private logger = new Logger('LLMService');
   private provider: string;
@@ -132,7 +160,7 @@ Examples:
           await this.sleep(delay);
         }
 
-        const response = await axios.post(
+        const response = await httpClient.post(
           'https://openrouter.ai/api/v1/chat/completions',
           {
             model: this.model,
@@ -227,7 +255,7 @@ Examples:
   private async callOllama(prompt: string): Promise<LLMResponse> {
     const baseUrl = this.baseUrl || 'http://localhost:11434';
     
-    const response = await axios.post(
+    const response = await httpClient.post(
       `${baseUrl}/api/generate`,
       {
         model: this.model, // e.g., 'phi3:mini'
@@ -262,7 +290,7 @@ Examples:
       throw new Error('OpenAI API key not provided');
     }
 
-    const response = await axios.post(
+    const response = await httpClient.post(
       'https://api.openai.com/v1/chat/completions',
       {
         model: this.model, // e.g., 'gpt-3.5-turbo'
@@ -335,40 +363,18 @@ Examples:
 
     // Extract price using regex - handle k, m, and UGX formats
     let price: number | null = null;
-    const pricePatterns = [
-      /(\d+(?:\.\d+)?)\s*m\b/i,  // "2.5m" format
-      /(\d+(?:\.\d+)?)\s*k\b/i,  // "55k" format
-      /(\d+(?:,\d{3})*)\s*(?:ugx|shillings?)\b/i,  // "55,000 UGX" format
-      /(\d+(?:,\d{3})*)\s*(?:only|price|cost)/i    // "55,000 only" format
-    ];
-
-    for (const pattern of pricePatterns) {
+    for (const { pattern, multiplier } of PRICE_PATTERNS) {
       const match = caption.match(pattern);
       if (match) {
         const numStr = match[1].replace(/,/g, '');
-        const num = parseFloat(numStr);
-
-        if (pattern.source.includes('m\\b')) {
-          price = num * 1000000; // millions
-        } else if (pattern.source.includes('k\\b')) {
-          price = num * 1000; // thousands
-        } else {
-          price = num; // direct number
-        }
+        price = parseFloat(numStr) * multiplier;
         break;
       }
     }
 
     // Extract sizes/variants using flexible regex
     let sizes: string | null = null;
-    const sizePatterns = [
-      /sizes?\s*:?\s*([^,\n.!?]+)/i,  // "sizes: 37-41" or "size: Large"
-      /(\d+(?:\s*[-–—]\s*\d+)?)\s*(?:size|inch|gb|tb|bedroom|year)/i,  // "256GB", "3 bedroom", "2018 year"
-      /model\s+(\d{4})/i,  // "model 2018"
-      /(\d+)\s*(?:bedroom|room)/i,  // "3 bedroom"
-    ];
-
-    for (const pattern of sizePatterns) {
+    for (const pattern of SIZE_PATTERNS) {
       const match = caption.match(pattern);
       if (match) {
         sizes = match[1].trim();
@@ -408,7 +414,7 @@ Examples:
              !cleanWord.startsWith('#') &&
              !cleanWord.startsWith('@') &&
              !/^\d+[km]?$/.test(cleanWord) &&
-             !['only', 'new', 'available', 'sizes', 'price', 'ugx', 'shillings', 'call', 'contact', 'dm'].includes(cleanWord);
+             !TITLE_STOPWORDS.has(cleanWord);
     });
 
     if (words.length > 0) {
@@ -6,6 +6,7 @@ Analyzes video frames to detect products and assess quality
 
 import sys
 import json
+import importlib.util
 import cv2
 import numpy as np
 from pathlib import Path
@@ -15,13 +16,41 @@ import logging
 # Configure logging
 logging.basicConfig(level=logging.WARNING)  # Suppress YOLO verbose output
 
+# Directory suffixes Ultralytics uses for OpenVINO exports, best first
+OPENVINO_EXPORT_SUFFIXES = ('_int8_openvino_model', '_openvino_model')
+
+def find_openvino_export(model_path: str):
+    """Return an OpenVINO export sitting next to the weights, if one was shipped and can be loaded"""
+    weights = Path(model_path)
+    for suffix in OPENVINO_EXPORT_SUFFIXES:
+        candidate = weights.with_name(f"{weights.stem}{suffix}")
+        if candidate.is_dir():
+            # Loading the export needs the openvino runtime, which only requirements-export.txt installs
+            if importlib.util.find_spec('openvino') is None:
+                logging.warning(f"Ignoring OpenVINO export {candidate}: openvino is not installed")
+                return None
+            return candidate
+    return None
+
+def export_openvino(model_path: str, int8: bool = True) -> str:
+    """One-time export of the weights to OpenVINO (INT8 calibrated, or FP16)"""
+    model = YOLO(model_path)
+    if int8:
+        return model.export(format='openvino', half=True, int8=True, data='coco128.yaml')
+    return model.export(format='openvino', half=True)
+
 class FrameAnalyzer:
     def __init__(self, model_path: str, confidence_threshold: float = 0.5, iou_threshold: float = 0.5):
         """Initialize the YOLO model and thresholds"""
         try:
             # Use YOLOv8n (nano) for speed and efficiency
             if Path(model_path).exists():
-                self.model = YOLO(model_path)
+                # Prefer a quantized OpenVINO export of the same weights when present
+                exported_model = find_openvino_export(model_path)
+                if exported_model is not None:
+                    self.model = YOLO(str(exported_model), task='detect')
+                else:
+                    self.model = YOLO(model_path)
             else:
                 # Download YOLOv8n if custom model not found
                 self.model = YOLO('yolov8n.pt')
@@ -42,81 +71,118 @@ class FrameAnalyzer:
                 'tennis racket', 'backpack', 'umbrella'
             }
             
+            # Bitmap over class ids: bit i is set when model.names[i] is a product class
+            self._product_mask = 0
+            for class_id, class_name in self.model.names.items():
+                if class_name in self.product_classes:
+                    self._product_mask |= 1 << class_id
+            
         except Exception as e:
             raise RuntimeError(f"Failed to initialize YOLO model: {e}")
 
     def analyze_frame(self, image_path: str) -> dict:
         """Analyze a single frame and return quality metrics and detections"""
-        try:
-            # Load image
+        return self.analyze_frames([image_path])[0]
+
+    def analyze_frames(self, image_paths: list) -> list:
+        """Analyze several frames with one batched YOLO forward pass"""
+        # Load images; a frame that cannot be read gets its own error result
+        # instead of failing the rest of the batch
+        analyses = [None] * len(image_paths)
+        images = []
+        loaded = []
+        for i, image_path in enumerate(image_paths):
             image = cv2.imread(image_path)
             if image is None:
-                raise ValueError(f"Could not load image: {image_path}")
-            
-            # Run YOLO detection
-            results = self.model(image, conf=self.confidence_threshold, iou=self.iou_threshold, verbose=False)
-            
-            # Extract detections
-            detected_objects = []
-            has_product = False
-            
-            if len(results) > 0 and results[0].boxes is not None:
-                boxes = results[0].boxes
-                for i in range(len(boxes)):
-                    # Get class name
-                    class_id = int(boxes.cls[i])
-                    class_name = self.model.names[class_id]
-                    confidence = float(boxes.conf[i])
-                    
-                    # Get bounding box (normalized)
-                    x1, y1, x2, y2 = boxes.xyxyn[i].tolist()
-                    
-                    detected_objects.append({
-                        'class_name': class_name,
-                        'confidence': confidence,
-                        'bbox': {
-                            'x': x1,
-                            'y': y1,
-                            'width': x2 - x1,
-                            'height': y2 - y1
-                        }
-                    })
-                    
-                    # Check if it's a product-related object
-                    if class_name in self.product_classes:
-                        has_product = True
-            
-            # Calculate quality metrics
-            quality_metrics = self._calculate_quality_metrics(image)
+                analyses[i] = _error_result(f"Could not load image: {image_path}")
+            else:
+                images.append(image)
+                loaded.append(i)
+        
+        if not images:
+            return analyses
+        
+        try:
+            # Run YOLO detection once for the whole batch (Ultralytics letterboxes
+            # each frame to imgsz, so aspect ratios are preserved)
+            results = self.model(images, conf=self.confidence_threshold, iou=self.iou_threshold, verbose=False)
             
-            # Calculate composition score based on detections
-            composition_score = self._calculate_composition_score(detected_objects, image.shape)
-            
-            return {
-                'detected_objects': detected_objects,
-                'has_product': has_product,
-                'quality_score': quality_metrics['overall_quality'],
-                'blur_score': quality_metrics['blur_score'],
-                'brightness_score': quality_metrics['brightness_score'],
-                'composition_score': composition_score
-            }
+            for i, image, result in zip(loaded, images, results):
+                analyses[i] = self._build_analysis(image, result)
+            return analyses
             
         except Exception as e:
             raise RuntimeError(f"Frame analysis failed: {e}")
 
+    def _build_analysis(self, image: np.ndarray, result) -> dict:
+        """Turn one frame's YOLO result into detections and scores"""
+        # Extract detections
+        detected_objects = []
+        has_product = False
+        xyxyn = np.empty((0, 4), dtype=np.float32)
+        confidences = np.empty(0, dtype=np.float32)
+        
+        if result.boxes is not None:
+            boxes = result.boxes
+            # Three bulk device-to-host copies instead of per-detection tensor indexing
+            xyxyn = boxes.xyxyn.cpu().numpy()
+            confidences = boxes.conf.cpu().numpy()
+            class_ids = boxes.cls.cpu().numpy().astype(np.int64).tolist()
+            names = self.model.names
+            
+            # Bounding boxes are normalized (x, y, width, height)
+            detected_objects = [
+                {
+                    'class_name': names[class_id],
+                    'confidence': confidence,
+                    'bbox': {
+                        'x': x1,
+                        'y': y1,
+                        'width': x2 - x1,
+                        'height': y2 - y1
+                    }
+                }
+                for class_id, confidence, (x1, y1, x2, y2)
+                in zip(class_ids, confidences.tolist(), xyxyn.tolist())
+            ]
+            
+            # Check if any detection is a product-related object
+            has_product = any(self._product_mask >> class_id & 1 for class_id in class_ids)
+        
+        # Calculate quality metrics on the full frame; the Laplacian variance behind the
+        # blur score is resolution-dependent and was calibrated at native resolution
+        quality_metrics = self._calculate_quality_metrics(image)
+        
+        # Calculate composition score based on detections
+        composition_score = self._calculate_composition_score(xyxyn, confidences)
+        
+        return {
+            'detected_objects': detected_objects,
+            'has_product': has_product,
+            'quality_score': quality_metrics['overall_quality'],
+            'blur_score': quality_metrics['blur_score'],
+            'brightness_score': quality_metrics['brightness_score'],
+            'composition_score': composition_score
+        }
+
     def _calculate_quality_metrics(self, image: np.ndarray) -> dict:
         """Calculate image quality metrics"""
         # Convert to grayscale for analysis
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # Calculate blur score using Laplacian variance
-        blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
+        # Single-pass mean/std of the grayscale frame (brightness and contrast)
+        gray_mean, gray_std = cv2.meanStdDev(gray)
+        
+        # Calculate blur score using Laplacian variance; CV_32F is exact for
+        # 8-bit input and meanStdDev keeps the reduction inside OpenCV
+        _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        blur_score = float(laplacian_std[0, 0]) ** 2
         # Normalize blur score (higher variance = less blur)
         normalized_blur = min(blur_score / 1000.0, 1.0)  # Normalize to 0-1
         blur_score_final = 1.0 - normalized_blur  # Invert so lower is better
         
         # Calculate brightness score
-        brightness = np.mean(gray) / 255.0
+        brightness = float(gray_mean[0, 0]) / 255.0
         # Optimal brightness is around 0.4-0.8
         if brightness < 0.2:
             brightness_score = brightness * 2.5  # Scale up dark images
@@ -128,7 +194,7 @@ class FrameAnalyzer:
         brightness_score = max(0.0, min(1.0, brightness_score))
         
         # Calculate contrast score
-        contrast = gray.std() / 255.0
+        contrast = float(gray_std[0, 0]) / 255.0
         contrast_score = min(contrast * 2, 1.0)  # Normalize to 0-1
         
         # Overall quality score
@@ -145,57 +211,64 @@ class FrameAnalyzer:
             'overall_quality': overall_quality
         }
 
-    def _calculate_composition_score(self, detected_objects: list, image_shape: tuple) -> float:
+    def _calculate_composition_score(self, xyxyn: np.ndarray, confidences: np.ndarray) -> float:
         """Calculate composition score based on object placement"""
-        if not detected_objects:
+        if len(confidences) == 0:
             return 0.3  # Low score for no objects
         
-        height, width = image_shape[:2]
-        center_x, center_y = 0.5, 0.5
+        # All detections are scored at once from the (N, 4) normalized boxes
+        x1, y1, x2, y2 = xyxyn[:, 0], xyxyn[:, 1], xyxyn[:, 2], xyxyn[:, 3]
         
-        composition_score = 0.0
-        max_confidence = 0.0
+        # Distance of each object center from the image center
+        distance_from_center = np.hypot((x1 + x2) / 2 - 0.5, (y1 + y2) / 2 - 0.5)
         
-        for obj in detected_objects:
-            bbox = obj['bbox']
-            confidence = obj['confidence']
-            
-            # Calculate object center
-            obj_center_x = bbox['x'] + bbox['width'] / 2
-            obj_center_y = bbox['y'] + bbox['height'] / 2
-            
-            # Distance from image center (rule of thirds consideration)
-            distance_from_center = np.sqrt(
-                (obj_center_x - center_x) ** 2 + (obj_center_y - center_y) ** 2
+        # Prefer objects not exactly in center but not too far
+        center_scores = 1.0 - np.minimum(distance_from_center * 2, 1.0)
+        
+        # Size score - prefer objects that are not too small or too large
+        obj_areas = (x2 - x1) * (y2 - y1)
+        size_scores = np.where(
+            obj_areas < 0.1,
+            obj_areas * 10,  # Scale up small objects
+            np.where(
+                obj_areas <= 0.6,
+                1.0,  # Good size range
+                np.maximum(0.2, 1.0 - (obj_areas - 0.6) * 2)  # Scale down large objects
             )
-            
-            # Prefer objects not exactly in center but not too far
-            center_score = 1.0 - min(distance_from_center * 2, 1.0)
-            
-            # Size score - prefer objects that are not too small or too large
-            obj_area = bbox['width'] * bbox['height']
-            if 0.1 <= obj_area <= 0.6:  # Good size range
-                size_score = 1.0
-            elif obj_area < 0.1:
-                size_score = obj_area * 10  # Scale up small objects
-            else:
-                size_score = max(0.2, 1.0 - (obj_area - 0.6) * 2)  # Scale down large objects
-            
-            # Combined score for this object
-            obj_score = (center_score * 0.4 + size_score * 0.6) * confidence
-            composition_score = max(composition_score, obj_score)
-            max_confidence = max(max_confidence, confidence)
+        )
+        
+        # Combined score per object; keep the best one
+        obj_scores = (center_scores * 0.4 + size_scores * 0.6) * confidences
+        composition_score = max(float(obj_scores.max()), 0.0)
         
         # Boost score if we have high-confidence detections
-        if max_confidence > 0.8:
+        if float(confidences.max()) > 0.8:
             composition_score *= 1.2
         
         return min(composition_score, 1.0)
 
+def _error_result(message: str) -> dict:
+    """Result returned for a frame that could not be analyzed"""
+    return {
+        'error': message,
+        'detected_objects': [],
+        'has_product': False,
+        'quality_score': 0.0,
+        'blur_score': 1.0,
+        'brightness_score': 0.0,
+        'composition_score': 0.0
+    }
+
 def main():
     """Main function for command-line usage"""
+    if len(sys.argv) in (3, 4) and sys.argv[1] == '--export':
+        # Build-time step: python yolo_analyzer.py --export <model_path> [--fp16]
+        print(export_openvino(sys.argv[2], int8='--fp16' not in sys.argv[3:]))
+        return
+    
     if len(sys.argv) != 5:
         print("Usage: python yolo_analyzer.py <image_path> <model_path> <confidence_threshold> <iou_threshold>")
+        print("       python yolo_analyzer.py --export <model_path> [--fp16]")
         sys.exit(1)
     
     image_path = sys.argv[1]
@@ -209,18 +282,11 @@ def main():
         
         # Output JSON result
         print(json.dumps(result, indent=2))
+        if 'error' in result:
+            sys.exit(1)
         
     except Exception as e:
-        error_result = {
-            'error': str(e),
-            'detected_objects': [],
-            'has_product': False,
-            'quality_score': 0.0,
-            'blur_score': 1.0,
-            'brightness_score': 0.0,
-            'composition_score': 0.0
-        }
-        print(json.dumps(error_result, indent=2))
+        print(json.dumps(_error_result(str(e)), indent=2))
         sys.exit(1)
 
 if __name__ == "__main__":
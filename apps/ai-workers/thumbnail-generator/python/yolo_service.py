@@ -8,32 +8,83 @@ import os
 import sys
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import ast
+import fcntl
+import hashlib
+import shutil
+import tempfile
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
 from pathlib import Path
 import cv2
 import numpy as np
 from PIL import Image
 import torch
+import torch.nn.functional as F
+import torchvision
+from torchvision.io import ImageReadMode, decode_image, decode_jpeg
 from ultralytics import YOLO
+from ultralytics.engine.results import Boxes
+from ultralytics.utils import ops
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except ImportError:
+    # Ultralytics releases before NMS moved out of ops
+    from ultralytics.utils.ops import non_max_suppression
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+import msgspec
 import uvicorn
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Input size the model (and any exported engine) runs at
+MODEL_IMGSZ = 640
+
+# Ultralytics' default NMS settings, used when running the raw model directly
+NMS_IOU_THRESHOLD = 0.7
+NMS_MAX_DETECTIONS = 300
+
+# Per-thread grayscale buffers reused across frames of the same size
+_metric_buffers = threading.local()
+
+# Per-thread pinned host buffers and copy stream for CPU-decoded frames on CUDA
+_upload_buffers = threading.local()
+
 class FrameAnalysisRequest(BaseModel):
     frame_path: str
     frame_index: int
     timestamp: float
 
-class DetectedObject(BaseModel):
+class SharedFrameRequest(BaseModel):
+    """A raw BGR frame placed in a POSIX shared-memory segment by a co-located producer"""
+    shm_name: str
+    shape: List[int]  # [height, width, 3]
+    dtype: str = "uint8"
+    offset: int = 0
+    frame_index: int
+    timestamp: float
+    
+    @property
+    def frame_path(self) -> str:
+        return f"shm:{self.shm_name}"
+
+# Response types are msgspec Structs: cheap to build per box and encoded in C
+class DetectedObject(msgspec.Struct):
     class_name: str
     confidence: float
     bbox: List[float]  # [x1, y1, x2, y2]
 
-class FrameAnalysisResponse(BaseModel):
+class FrameAnalysisResponse(msgspec.Struct):
     frame_index: int
     timestamp: float
     has_product: bool
@@ -42,14 +93,204 @@ class FrameAnalysisResponse(BaseModel):
     blur_score: float
     detected_objects: List[DetectedObject]
 
+class TensorFrame(NamedTuple):
+    """A frame letterboxed into a model input on the GPU, with its quality metrics"""
+    input: torch.Tensor  # (3, MODEL_IMGSZ, MODEL_IMGSZ) uint8 RGB
+    shape: Tuple[int, int]  # original (height, width)
+    metrics: Tuple[float, float]  # (blur_score, brightness_score)
+    ready: Optional[torch.cuda.Event] = None  # set when the input is still being copied in
+    key: Optional[Tuple[int, int, int]] = None  # detection cache key, when caching is enabled
+
+class DetectionResult(NamedTuple):
+    """Stand-in for an Ultralytics Results when the model runs outside its predictor; only boxes are read"""
+    boxes: Boxes
+
+def blur_score_from_variance(laplacian_var: float) -> float:
+    """Normalize Laplacian variance to 0-1 scale (higher = less blurry)"""
+    return min(laplacian_var / 1000.0, 1.0)
+
+def brightness_score_from_mean(mean_brightness: float) -> float:
+    """Flat at 1.0 between 0.3 and 0.8, ramping down linearly on either side"""
+    return max(0.0, min(mean_brightness / 0.3, (1.0 - mean_brightness) / 0.2, 1.0))
+
+def average_hash(thumbnail: np.ndarray) -> int:
+    """64-bit average hash of an 8x8 grayscale thumbnail"""
+    bits = (thumbnail > thumbnail.mean()).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+class DetectionCache:
+    """Thread-safe LRU of (has_product, detected_objects) keyed by a frame's average hash and size"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+    
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSONResponse rendered with msgspec instead of the stdlib json module"""
+    
+    def render(self, content: Any) -> bytes:
+        return msgspec.json.encode(content)
+
+def json_response(obj: Any) -> MsgspecJSONResponse:
+    """Return a response directly, bypassing FastAPI's jsonable_encoder/response_model pass"""
+    return MsgspecJSONResponse(obj)
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment owned by another process without unlinking it when this process exits"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers the segment with the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def export_atomically(checkpoint: Path, target: Path, **export_args):
+    """Export checkpoint to target once, even when several worker processes start together"""
+    with open(target.with_name(f"{target.name}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another worker may have finished the export while this one waited
+        if target.exists():
+            return
+        
+        # Ultralytics writes its outputs next to the weights, so export a private copy
+        with tempfile.TemporaryDirectory(dir=target.parent) as scratch:
+            weights = Path(scratch) / checkpoint.name
+            shutil.copyfile(checkpoint, weights)
+            exported = YOLO(str(weights)).export(**export_args)
+            os.replace(exported, target)
+
+def server_workers() -> int:
+    """uvicorn worker count; a GPU host runs one so a single model replica batches every request"""
+    return int(os.getenv("YOLO_WORKERS", "1" if torch.cuda.is_available() else "2"))
+
+def letterbox_cpu(image: np.ndarray) -> np.ndarray:
+    """Resize and pad a BGR frame the way Ultralytics' LetterBox does"""
+    height, width = image.shape[:2]
+    ratio = min(MODEL_IMGSZ / height, MODEL_IMGSZ / width)
+    new_height, new_width = round(height * ratio), round(width * ratio)
+    if (new_height, new_width) != (height, width):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    
+    top = round((MODEL_IMGSZ - new_height) / 2 - 0.1)
+    left = round((MODEL_IMGSZ - new_width) / 2 - 0.1)
+    return cv2.copyMakeBorder(
+        image, top, MODEL_IMGSZ - new_height - top, left, MODEL_IMGSZ - new_width - left,
+        cv2.BORDER_CONSTANT, value=(114, 114, 114)
+    )
+
+class OnnxDetector:
+    """onnxruntime session over an exported YOLO detector, called like the Ultralytics predictor"""
+    
+    def __init__(self, onnx_path: str, confidence_threshold: float, device: str, batch_size: int = 1):
+        import onnxruntime as ort
+        
+        # TensorRT and CUDA providers when present, always falling back to CPU
+        providers = [('CPUExecutionProvider', {})]
+        if device == 'cuda':
+            # Cache built engines next to the (checkpoint-hashed) ONNX file and build one
+            # FP16 profile covering batches 1..batch_size, so restarts skip the engine build
+            cache_dir = Path(onnx_path).with_suffix('.trt_cache')
+            cache_dir.mkdir(exist_ok=True)
+            min_shape = f"images:1x3x{MODEL_IMGSZ}x{MODEL_IMGSZ}"
+            max_shape = f"images:{batch_size}x3x{MODEL_IMGSZ}x{MODEL_IMGSZ}"
+            trt_options = {
+                'trt_engine_cache_enable': True,
+                'trt_engine_cache_path': str(cache_dir),
+                'trt_fp16_enable': True,
+                'trt_profile_min_shapes': min_shape,
+                'trt_profile_opt_shapes': max_shape,
+                'trt_profile_max_shapes': max_shape
+            }
+            providers = [('TensorrtExecutionProvider', trt_options), ('CUDAExecutionProvider', {})] + providers
+        available = ort.get_available_providers()
+        self.session = ort.InferenceSession(onnx_path, providers=[p for p in providers if p[0] in available])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = ast.literal_eval(self.session.get_modelmeta().custom_metadata_map['names'])
+        self.confidence_threshold = confidence_threshold
+        logger.info(f"ONNX Runtime providers: {self.session.get_providers()}")
+    
+    def __call__(self, source) -> List[DetectionResult]:
+        if isinstance(source, torch.Tensor):
+            # Already letterboxed; boxes stay in model-input coordinates
+            batch = source.float().cpu().numpy()
+            shapes = [(MODEL_IMGSZ, MODEL_IMGSZ)] * len(batch)
+        else:
+            batch = np.stack([letterbox_cpu(image)[..., ::-1].transpose(2, 0, 1) for image in source])
+            batch = batch.astype(np.float32) * (1.0 / 255.0)
+            shapes = [image.shape[:2] for image in source]
+        
+        output = self.session.run(None, {self.input_name: batch})[0]
+        detections = non_max_suppression(
+            torch.from_numpy(output), self.confidence_threshold, NMS_IOU_THRESHOLD, max_det=NMS_MAX_DETECTIONS
+        )
+        
+        results = []
+        for det, shape in zip(detections, shapes):
+            det[:, :4] = ops.scale_boxes((MODEL_IMGSZ, MODEL_IMGSZ), det[:, :4], shape)
+            results.append(DetectionResult(Boxes(det, shape)))
+        return results
+
+def failed_analysis(frame_index: int, timestamp: float) -> FrameAnalysisResponse:
+    """Default response for a frame that could not be analyzed"""
+    return FrameAnalysisResponse(
+        frame_index=frame_index,
+        timestamp=timestamp,
+        has_product=False,
+        quality_score=0.0,
+        brightness_score=0.0,
+        blur_score=0.0,
+        detected_objects=[]
+    )
+
 class YOLOService:
-    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5):
+    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5, batch_size: int = 8,
+                 gpu_decode: bool = False, pinned_upload: bool = False, cache_size: int = 0,
+                 cuda_graphs: bool = False):
         """Initialize YOLO service with model loading"""
         self.confidence_threshold = confidence_threshold
+        self.batch_size = max(1, batch_size)
         self.model_path = model_path
         self.model = None
+        self.backend = 'pytorch'
+        self.half = False
+        self.predictor = None
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         
+        # Decode and letterbox frames on the GPU instead of handing BGR arrays to Ultralytics
+        self.gpu_decode = gpu_decode and self.device == 'cuda'
+        if self.gpu_decode:
+            self.gray_weights = torch.tensor([0.299, 0.587, 0.114], device=self.device).view(3, 1, 1)
+            self.laplacian_kernel = torch.tensor(
+                [[0.0, 1.0, 0.0], [1.0, -4.0, 1.0], [0.0, 1.0, 0.0]], device=self.device
+            ).view(1, 1, 3, 3)
+        
+        # Otherwise stage CPU-decoded frames through pinned buffers so uploads overlap inference
+        self.pinned_upload = pinned_upload and self.device == 'cuda' and not self.gpu_decode
+        
+        # Fixed-shape GPU batches can replay a captured CUDA graph (PyTorch backend only);
+        # one graph is captured at batch_size and smaller batches are padded into it
+        self.use_cuda_graphs = cuda_graphs and (self.gpu_decode or self.pinned_upload)
+        self.cuda_graph: Optional[tuple] = None
+        
+        # Near-identical adjacent keyframes reuse detections instead of re-running the model
+        self.detection_cache = DetectionCache(cache_size) if cache_size > 0 else None
+        
         # Product-related class names from COCO dataset
         self.product_classes = {
             'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
@@ -69,142 +310,728 @@ class YOLOService:
         """Load YOLO model"""
         try:
             logger.info(f"Loading YOLO model: {self.model_path} on device: {self.device}")
-            self.model = YOLO(self.model_path)
-            self.model.to(self.device)
-            logger.info("YOLO model loaded successfully")
+            if os.getenv("YOLO_BACKEND", "pytorch") == "onnx":
+                try:
+                    detector = OnnxDetector(
+                        self.onnx_model_path(), self.confidence_threshold, self.device, self.batch_size
+                    )
+                    # Warm up here so a session that cannot run still falls back to PyTorch
+                    detector(source=[np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8)])
+                    self.model = detector
+                    self.backend = 'onnx'
+                    # ONNX Runtime takes host arrays, so GPU staging buffers would only add a round trip
+                    self.pinned_upload = False
+                except Exception as e:
+                    logger.warning(f"ONNX Runtime backend unavailable, falling back to PyTorch: {e}")
+            elif self.device == 'cuda' and os.getenv("YOLO_USE_TRT", "0") == "1":
+                try:
+                    self.model = YOLO(self.tensorrt_engine_path(), task='detect')
+                    self.backend = 'tensorrt'
+                except Exception as e:
+                    logger.warning(f"TensorRT engine unavailable, falling back to PyTorch: {e}")
+            
+            if self.model is None:
+                self.model = YOLO(self.model_path)
+                self.model.to(self.device)
+            
+            # FP16 on CUDA for the PyTorch backend; an exported engine carries its own precision
+            self.half = self.device == 'cuda' and self.backend == 'pytorch'
+            
+            # TensorRT already runs a fused, captured engine
+            self.use_cuda_graphs = self.use_cuda_graphs and self.backend == 'pytorch'
+            
+            if self.backend == 'onnx':
+                # The session wrapper is called the same way as the predictor (already warmed up)
+                self.predictor = self.model
+            else:
+                # A warmup predict builds, fuses and configures the Ultralytics predictor once;
+                # later calls go straight to it instead of through Model.predict
+                self.model.predict(
+                    np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8),
+                    conf=self.confidence_threshold,
+                    half=self.half,
+                    verbose=False
+                )
+                self.predictor = self.model.predictor
+            
+            if self.use_cuda_graphs:
+                # Capture now, while nothing else touches the GPU: once the pipeline's reader
+                # threads are uploading and decoding, their CUDA calls would break a global-mode capture
+                self.cuda_graph = self.capture_graph()
+            
+            # Index product classes by class id so the per-box check is an array lookup
+            names = self.model.names
+            self.product_class_ids = np.zeros(max(names) + 1, dtype=bool)
+            for class_id, class_name in names.items():
+                self.product_class_ids[class_id] = class_name in self.product_classes
+            logger.info(f"YOLO model loaded successfully ({self.backend})")
         except Exception as e:
             logger.error(f"Failed to load YOLO model: {e}")
             raise
     
-    def calculate_blur_score(self, image: np.ndarray) -> float:
+    def resolve_checkpoint(self) -> Tuple[Path, str]:
+        """Locate the .pt checkpoint (downloading it if needed) and hash its contents"""
+        checkpoint = Path(YOLO(self.model_path).ckpt_path or self.model_path)
+        digest = hashlib.sha256(checkpoint.read_bytes()).hexdigest()[:16]
+        return checkpoint, digest
+    
+    def onnx_model_path(self) -> str:
+        """Export the model to ONNX with a dynamic batch, cached on disk by checkpoint hash"""
+        checkpoint, digest = self.resolve_checkpoint()
+        onnx_path = checkpoint.parent / f"{checkpoint.stem}.{digest}.onnx"
+        
+        if not onnx_path.exists():
+            logger.info(f"Exporting ONNX model: {onnx_path}")
+            export_atomically(
+                checkpoint, onnx_path, format="onnx", imgsz=MODEL_IMGSZ, dynamic=True, simplify=True, opset=17
+            )
+        
+        return str(onnx_path)
+    
+    def tensorrt_engine_path(self) -> str:
+        """Export the model to a TensorRT FP16 engine, cached per weights, GPU, TensorRT version and input shape"""
+        try:
+            import tensorrt
+            trt_version = tensorrt.__version__
+        except ImportError:
+            trt_version = "unknown"
+        
+        checkpoint, digest = self.resolve_checkpoint()
+        gpu_name = torch.cuda.get_device_name(0).replace(' ', '-')
+        key = f"{digest}_{gpu_name}_trt{trt_version}_b{self.batch_size}_{MODEL_IMGSZ}_fp16"
+        engine_path = checkpoint.parent / f"{checkpoint.stem}.{key}.engine"
+        
+        if not engine_path.exists():
+            logger.info(f"Building TensorRT engine: {engine_path}")
+            export_atomically(
+                checkpoint,
+                engine_path,
+                format="engine",
+                imgsz=MODEL_IMGSZ,
+                half=True,
+                dynamic=True,
+                batch=self.batch_size,
+                device=0
+            )
+        
+        return str(engine_path)
+    
+    def to_gray(self, image: np.ndarray) -> np.ndarray:
+        """Convert a BGR frame to grayscale into this thread's reusable buffer"""
+        buffer = getattr(_metric_buffers, 'gray', None)
+        if buffer is None or buffer.shape != image.shape[:2]:
+            buffer = np.empty(image.shape[:2], dtype=np.uint8)
+            _metric_buffers.gray = buffer
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buffer)
+    
+    def _blur_from_gray(self, gray: np.ndarray) -> float:
         """Calculate blur score using Laplacian variance"""
+        # float32 Laplacian with the variance reduced inside OpenCV
+        laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+        _, std = cv2.meanStdDev(laplacian)
+        return blur_score_from_variance(float(std[0, 0]) ** 2)
+    
+    def _brightness_from_gray(self, gray: np.ndarray) -> float:
+        """Calculate brightness score"""
+        return brightness_score_from_mean(cv2.mean(gray)[0] * (1.0 / 255.0))
+    
+    def quality_metrics(self, image: np.ndarray) -> Tuple[float, float]:
+        """Calculate (blur_score, brightness_score) from a single grayscale conversion"""
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            # Normalize to 0-1 scale (higher = less blurry)
-            blur_score = min(laplacian_var / 1000.0, 1.0)
-            return blur_score
+            # Full resolution: the Laplacian variance is resolution-dependent and
+            # blur_score_from_variance is calibrated at native resolution
+            gray = self.to_gray(image)
+            return self._blur_from_gray(gray), self._brightness_from_gray(gray)
         except Exception as e:
-            logger.warning(f"Failed to calculate blur score: {e}")
-            return 0.5
+            logger.warning(f"Failed to calculate quality metrics: {e}")
+            return 0.5, 0.5
     
-    def calculate_brightness_score(self, image: np.ndarray) -> float:
-        """Calculate brightness score"""
+    def _gpu_quality_metrics(self, rgb: torch.Tensor) -> Tuple[float, float]:
+        """Calculate (blur_score, brightness_score) for a decoded float RGB frame on the GPU"""
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            mean_brightness = np.mean(gray) / 255.0
-            # Optimal brightness is around 0.4-0.7, penalize too dark or too bright
-            if 0.3 <= mean_brightness <= 0.8:
-                brightness_score = 1.0
-            elif mean_brightness < 0.3:
-                brightness_score = mean_brightness / 0.3
-            else:
-                brightness_score = (1.0 - mean_brightness) / 0.2
-            return max(0.0, min(1.0, brightness_score))
+            # Full resolution, as in quality_metrics
+            gray = (rgb * self.gray_weights).sum(dim=0)[None, None]
+            mean_brightness = gray.mean() / 255.0
+            laplacian = F.conv2d(F.pad(gray, (1, 1, 1, 1), mode='reflect'), self.laplacian_kernel)
+            # One device sync for both reductions
+            laplacian_var, mean_brightness = torch.stack([laplacian.var(unbiased=False), mean_brightness]).tolist()
+            return blur_score_from_variance(laplacian_var), brightness_score_from_mean(mean_brightness)
         except Exception as e:
-            logger.warning(f"Failed to calculate brightness score: {e}")
-            return 0.5
+            logger.warning(f"Failed to calculate quality metrics: {e}")
+            return 0.5, 0.5
+    
+    def load_image(self, frame_path: str) -> np.ndarray:
+        """Read a frame from disk"""
+        # One open+read instead of a stat followed by imread; open raises FileNotFoundError itself
+        with open(frame_path, 'rb') as f:
+            data = f.read()
+        
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Could not load image: {frame_path}")
+        return image
+    
+    def load_frame(self, frame_path: str):
+        """Read a frame as a GPU TensorFrame when GPU decoding is enabled, otherwise as a BGR array"""
+        if self.gpu_decode:
+            return self.preprocess_gpu(frame_path)
+        return self.frame_from_image(self.load_image(frame_path))
+    
+    def load_request(self, request):
+        """Load the frame a request points at, from shared memory or from disk"""
+        if isinstance(request, SharedFrameRequest):
+            return self.frame_from_image(self.load_shared_image(request))
+        return self.load_frame(request.frame_path)
     
-    def analyze_frame(self, frame_path: str, frame_index: int, timestamp: float) -> FrameAnalysisResponse:
-        """Analyze a single frame for product detection and quality"""
+    def load_shared_image(self, request: SharedFrameRequest) -> np.ndarray:
+        """Copy a raw BGR frame out of a shared-memory segment owned by the caller"""
+        if request.dtype != "uint8" or len(request.shape) != 3 or request.shape[2] != 3:
+            raise ValueError(f"Expected a uint8 [height, width, 3] BGR frame, got {request.dtype} {request.shape}")
+        
+        shm = attach_shared_memory(request.shm_name)
         try:
-            # Load image
-            if not os.path.exists(frame_path):
-                raise FileNotFoundError(f"Frame not found: {frame_path}")
+            view = np.ndarray(tuple(request.shape), dtype=np.uint8, buffer=shm.buf, offset=request.offset)
+            # One memcpy, no decode; the segment is released before the frame moves through the pipeline
+            image = view.copy()
+            del view
+        finally:
+            shm.close()
+        return image
+    
+    def frame_from_image(self, image: np.ndarray):
+        """Turn a BGR array into whatever frame form the configured inference path takes"""
+        if self.gpu_decode:
+            return self.tensor_frame_from_rgb(torch.from_numpy(image).to(self.device).permute(2, 0, 1).flip(0).float())
+        if self.pinned_upload:
+            return self.upload_frame(image)
+        return image
+    
+    def upload_frame(self, image: np.ndarray) -> TensorFrame:
+        """Letterbox a BGR frame into a pinned buffer and copy it to the GPU on a side stream"""
+        if not hasattr(_upload_buffers, 'slots'):
+            # Two buffers per thread: one can be refilled while the other is still being copied
+            _upload_buffers.slots = [
+                (torch.empty((3, MODEL_IMGSZ, MODEL_IMGSZ), dtype=torch.uint8).pin_memory(), torch.cuda.Event())
+                for _ in range(2)
+            ]
+            _upload_buffers.stream = torch.cuda.Stream()
+            _upload_buffers.next = 0
+        
+        host, copied = _upload_buffers.slots[_upload_buffers.next]
+        _upload_buffers.next ^= 1
+        copied.synchronize()
+        
+        # HWC BGR -> CHW RGB while filling the pinned buffer
+        np.copyto(host.numpy(), letterbox_cpu(image)[..., ::-1].transpose(2, 0, 1))
+        with torch.cuda.stream(_upload_buffers.stream):
+            device_input = host.to(self.device, non_blocking=True)
+            copied.record()
+        
+        return TensorFrame(device_input, image.shape[:2], self.quality_metrics(image), copied, self.image_key(image))
+    
+    def preprocess_gpu(self, frame_path: str) -> TensorFrame:
+        """Decode a frame on the GPU (nvJPEG for JPEGs) and letterbox it to the model input size"""
+        data = torchvision.io.read_file(frame_path)
+        if frame_path.lower().endswith(('.jpg', '.jpeg')):
+            rgb = decode_jpeg(data, mode=ImageReadMode.RGB, device=self.device)
+        else:
+            rgb = decode_image(data, mode=ImageReadMode.RGB).to(self.device)
+        
+        return self.tensor_frame_from_rgb(rgb.float())
+    
+    def tensor_frame_from_rgb(self, rgb: torch.Tensor) -> TensorFrame:
+        """Letterbox a float RGB CHW frame on the GPU and compute its metrics and cache key"""
+        _, height, width = rgb.shape
+        key = None
+        if self.detection_cache is not None:
+            thumbnail = (F.adaptive_avg_pool2d(rgb[None], 8)[0] * self.gray_weights).sum(dim=0)
+            key = (average_hash(thumbnail.cpu().numpy()), height, width)
+        return TensorFrame(self.letterbox_gpu(rgb), (height, width), self._gpu_quality_metrics(rgb), key=key)
+    
+    def letterbox_gpu(self, rgb: torch.Tensor) -> torch.Tensor:
+        """Resize and pad a float RGB frame the way Ultralytics' LetterBox does"""
+        _, height, width = rgb.shape
+        ratio = min(MODEL_IMGSZ / height, MODEL_IMGSZ / width)
+        new_height, new_width = round(height * ratio), round(width * ratio)
+        resized = F.interpolate(rgb[None], size=(new_height, new_width), mode='bilinear', align_corners=False)
+        
+        top = round((MODEL_IMGSZ - new_height) / 2 - 0.1)
+        left = round((MODEL_IMGSZ - new_width) / 2 - 0.1)
+        padding = (left, MODEL_IMGSZ - new_width - left, top, MODEL_IMGSZ - new_height - top)
+        return F.pad(resized, padding, value=114.0)[0].round_().to(torch.uint8)
+    
+    def image_key(self, image: np.ndarray) -> Optional[Tuple[int, int, int]]:
+        """Detection cache key for a BGR frame: its average hash plus its size"""
+        if self.detection_cache is None:
+            return None
+        thumbnail = cv2.cvtColor(cv2.resize(image, (8, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        height, width = image.shape[:2]
+        return (average_hash(thumbnail), height, width)
+    
+    def detection_key(self, frame) -> Optional[Tuple[int, int, int]]:
+        """Detection cache key for any loaded frame, or None when caching is disabled"""
+        if isinstance(frame, TensorFrame):
+            return frame.key
+        return self.image_key(frame)
+    
+    def cached_detections(self, key) -> Optional[Tuple[bool, List[DetectedObject]]]:
+        """Look up detections for a frame key"""
+        if key is None:
+            return None
+        return self.detection_cache.get(key)
+    
+    def prepare_frame(self, request):
+        """Load a request's frame and look up its cached detections; returns (frame, key, detections)"""
+        frame = self.load_request(request)
+        key = self.detection_key(frame)
+        return frame, key, self.cached_detections(key)
+    
+    def analyze_frames(self, frames: list, metas: List[Tuple[int, float]]) -> List[FrameAnalysisResponse]:
+        """Analyze loaded frames with batched forward passes of up to batch_size images"""
+        keys = [self.detection_key(frame) for frame in frames]
+        detections = [self.cached_detections(key) for key in keys]
+        
+        # Only frames without cached detections go through the model
+        misses = [i for i, cached in enumerate(detections) if cached is None]
+        for start in range(0, len(misses), self.batch_size):
+            batch = misses[start:start + self.batch_size]
+            results = self.predict([frames[i] for i in batch])
+            for i, result in zip(batch, results):
+                detections[i] = self.extract_detections(frames[i], result, keys[i])
+        
+        return [
+            self.score_frame(frame, frame_detections, frame_index, timestamp)
+            for frame, frame_detections, (frame_index, timestamp) in zip(frames, detections, metas)
+        ]
+    
+    def predict(self, frames: list) -> list:
+        """Run one forward pass over a batch of frames"""
+        if frames and isinstance(frames[0], TensorFrame):
+            stream = torch.cuda.current_stream()
+            for frame in frames:
+                if frame.ready is not None:
+                    # Order the upload before inference and keep its memory alive for this stream
+                    stream.wait_event(frame.ready)
+                    frame.input.record_stream(stream)
             
-            image = cv2.imread(frame_path)
-            if image is None:
-                raise ValueError(f"Could not load image: {frame_path}")
+            # Already letterboxed on the GPU; Ultralytics takes a BCHW [0, 1] tensor as-is
+            batch = torch.stack([frame.input for frame in frames]).float().div_(255.0)
+            if self.use_cuda_graphs:
+                return self.predict_graph(batch)
+            return self.predictor(source=batch)
+        return self.predictor(source=frames)
+    
+    def capture_graph(self) -> tuple:
+        """Capture the raw model forward for a (batch_size, 3, MODEL_IMGSZ, MODEL_IMGSZ) input as a CUDA graph"""
+        net = self.model.model
+        size = self.batch_size
+        with torch.inference_mode():
+            static_input = torch.zeros(
+                (size, 3, MODEL_IMGSZ, MODEL_IMGSZ), device=self.device, dtype=next(net.parameters()).dtype
+            )
             
-            # Run YOLO detection
-            results = self.model(image, conf=self.confidence_threshold, verbose=False)
+            # Warm up on a side stream so lazy initialization is not captured
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    net(static_input)
+            torch.cuda.current_stream().wait_stream(stream)
             
-            # Process detections
-            detected_objects = []
-            has_product = False
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_output = net(static_input)
+        
+        # Eval-mode heads return (predictions, raw feature maps)
+        if isinstance(static_output, (tuple, list)):
+            static_output = static_output[0]
+        
+        # The detect head rebuilds its anchor/stride tensors whenever it sees a new input
+        # shape (e.g. an uncaptured predictor call); the graph still reads the captured
+        # ones, so hold on to them for as long as the graph lives
+        head = net.model[-1]
+        anchors = (getattr(head, 'anchors', None), getattr(head, 'strides', None))
+        
+        logger.info(f"Captured CUDA graph for batch size {size}")
+        return static_input, static_output, graph, anchors
+    
+    def predict_graph(self, batch: torch.Tensor) -> List[DetectionResult]:
+        """Replay the CUDA graph captured in load_model over the batch, padded to batch_size, then run NMS"""
+        static_input, static_output, graph, _ = self.cuda_graph
+        capacity = static_input.shape[0]
+        
+        results = []
+        with torch.inference_mode():
+            for start in range(0, batch.shape[0], capacity):
+                chunk = batch[start:start + capacity]
+                size = chunk.shape[0]
+                # Rows past size keep stale inputs; their predictions are dropped before NMS
+                static_input[:size].copy_(chunk)
+                graph.replay()
+                detections = non_max_suppression(
+                    static_output[:size], self.confidence_threshold, NMS_IOU_THRESHOLD, max_det=NMS_MAX_DETECTIONS
+                )
+                results.extend(DetectionResult(Boxes(det, (MODEL_IMGSZ, MODEL_IMGSZ))) for det in detections)
+        return results
+    
+    def extract_detections(self, frame, result, key=None) -> Tuple[bool, List[DetectedObject]]:
+        """Turn one frame's YOLO result into (has_product, detected_objects), caching it under key"""
+        # Process detections
+        detected_objects = []
+        has_product = False
+        
+        if result.boxes is not None and len(result.boxes):
+            # One device-to-host copy; columns are x1, y1, x2, y2, conf, cls
+            data = result.boxes.data.cpu().numpy()
+            xyxy = data[:, :4]
+            if isinstance(frame, TensorFrame):
+                # Boxes come back in letterboxed model-input coordinates
+                xyxy = ops.scale_boxes((MODEL_IMGSZ, MODEL_IMGSZ), xyxy.copy(), frame.shape)
             
-            for result in results:
-                if result.boxes is not None:
-                    for box in result.boxes:
-                        # Get class name
-                        class_id = int(box.cls[0])
-                        class_name = self.model.names[class_id]
-                        confidence = float(box.conf[0])
-                        
-                        # Check if it's a product
-                        if class_name in self.product_classes:
-                            has_product = True
-                        
-                        # Get bounding box coordinates
-                        bbox = box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-                        
-                        detected_objects.append(DetectedObject(
-                            class_name=class_name,
-                            confidence=confidence,
-                            bbox=bbox
-                        ))
+            class_ids = data[:, -1].astype(np.int32)
+            has_product = bool(self.product_class_ids[class_ids].any())
             
-            # Calculate quality metrics
-            blur_score = self.calculate_blur_score(image)
-            brightness_score = self.calculate_brightness_score(image)
+            names = self.model.names
+            detected_objects = [
+                DetectedObject(class_name=names[class_id], confidence=confidence, bbox=bbox)
+                for class_id, confidence, bbox in zip(class_ids.tolist(), data[:, -2].tolist(), xyxy.tolist())
+            ]
+        
+        if key is not None:
+            self.detection_cache.put(key, (has_product, detected_objects))
+        return has_product, detected_objects
+    
+    def build_response(self, frame, result, frame_index: int, timestamp: float,
+                       key=None, detections: Optional[Tuple[bool, List[DetectedObject]]] = None) -> FrameAnalysisResponse:
+        """Build a frame's response from its YOLO result, or from cached detections"""
+        if detections is None:
+            detections = self.extract_detections(frame, result, key)
+        return self.score_frame(frame, detections, frame_index, timestamp)
+    
+    def score_frame(self, frame, detections: Tuple[bool, List[DetectedObject]],
+                    frame_index: int, timestamp: float) -> FrameAnalysisResponse:
+        """Combine detections with the frame's quality metrics into a FrameAnalysisResponse"""
+        has_product, detected_objects = detections
+        
+        # Calculate quality metrics
+        if isinstance(frame, TensorFrame):
+            blur_score, brightness_score = frame.metrics
+        else:
+            blur_score, brightness_score = self.quality_metrics(frame)
+        
+        # Calculate overall quality score
+        detection_score = 1.0 if has_product else 0.3
+        quality_score = (detection_score * 0.4 + blur_score * 0.3 + brightness_score * 0.3)
+        
+        return FrameAnalysisResponse(
+            frame_index=frame_index,
+            timestamp=timestamp,
+            has_product=has_product,
+            quality_score=quality_score,
+            brightness_score=brightness_score,
+            blur_score=blur_score,
+            detected_objects=detected_objects
+        )
+    
+    def analyze_request(self, request) -> FrameAnalysisResponse:
+        """Analyze the frame behind a path or shared-memory request"""
+        try:
+            frame = self.load_request(request)
+            return self.analyze_frames([frame], [(request.frame_index, request.timestamp)])[0]
+        except Exception as e:
+            logger.error(f"Frame analysis failed for {request.frame_path}: {e}")
+            return failed_analysis(request.frame_index, request.timestamp)
+
+def resolve(future: asyncio.Future, response: FrameAnalysisResponse):
+    """Complete a request future unless the caller already went away"""
+    if not future.done():
+        future.set_result(response)
+
+class FramePipeline:
+    """Overlaps frame loading, batched inference and quality scoring across requests"""
+    
+    def __init__(self, service: YOLOService, reader_workers: int = 4, post_workers: int = 2,
+                 max_batch_size: Optional[int] = None, max_latency_ms: float = 5.0):
+        self.service = service
+        self.reader_workers = max(1, reader_workers)
+        self.post_workers = max(1, post_workers)
+        
+        # A TensorRT engine is built for at most service.batch_size frames per pass
+        self.max_batch_size = max(1, min(max_batch_size or service.batch_size, service.batch_size))
+        self.max_latency = max_latency_ms / 1000.0
+        
+        # cv2 releases the GIL while decoding and filtering, so threads run these stages in parallel
+        self.reader_pool = ThreadPoolExecutor(max_workers=self.reader_workers, thread_name_prefix="frame-reader")
+        self.infer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-infer")
+        self.post_pool = ThreadPoolExecutor(max_workers=self.post_workers, thread_name_prefix="frame-post")
+        
+        self.reader_q: Optional[asyncio.Queue] = None
+        self.infer_q: Optional[asyncio.Queue] = None
+        self.post_q: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+    
+    def start(self):
+        """Start the stage workers on the running event loop"""
+        self.reader_q = asyncio.Queue()
+        self.infer_q = asyncio.Queue()
+        self.post_q = asyncio.Queue()
+        
+        self.tasks = [asyncio.create_task(self.read_stage()) for _ in range(self.reader_workers)]
+        self.tasks.append(asyncio.create_task(self.infer_stage()))
+        self.tasks.extend(asyncio.create_task(self.post_stage()) for _ in range(self.post_workers))
+    
+    async def stop(self):
+        """Cancel the stage workers and release the thread pools"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        
+        for pool in (self.reader_pool, self.infer_pool, self.post_pool):
+            pool.shutdown(wait=False)
+    
+    def submit(self, request) -> asyncio.Future:
+        """Queue a frame for analysis; the returned future resolves to its response"""
+        future = asyncio.get_running_loop().create_future()
+        self.reader_q.put_nowait((request, future))
+        return future
+    
+    async def read_stage(self):
+        """Load frames from disk; frames with cached detections skip inference"""
+        loop = asyncio.get_running_loop()
+        while True:
+            request, future = await self.reader_q.get()
+            try:
+                frame, key, detections = await loop.run_in_executor(
+                    self.reader_pool, self.service.prepare_frame, request
+                )
+            except Exception as e:
+                logger.error(f"Frame analysis failed for {request.frame_path}: {e}")
+                resolve(future, failed_analysis(request.frame_index, request.timestamp))
+                continue
             
-            # Calculate overall quality score
-            detection_score = 1.0 if has_product else 0.3
-            quality_score = (detection_score * 0.4 + blur_score * 0.3 + brightness_score * 0.3)
+            if detections is not None:
+                await self.post_q.put((request, frame, None, key, detections, future))
+            else:
+                await self.infer_q.put((request, frame, key, future))
+    
+    async def infer_stage(self):
+        """Coalesce queued frames into batches bounded by max_batch_size and max_latency"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.infer_q.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                if not self.infer_q.empty():
+                    batch.append(self.infer_q.get_nowait())
+                    continue
+                
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.infer_q.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
             
-            return FrameAnalysisResponse(
-                frame_index=frame_index,
-                timestamp=timestamp,
-                has_product=has_product,
-                quality_score=quality_score,
-                brightness_score=brightness_score,
-                blur_score=blur_score,
-                detected_objects=detected_objects
-            )
+            try:
+                results = await loop.run_in_executor(
+                    self.infer_pool, self.service.predict, [frame for _, frame, _, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(batch)} frames: {e}")
+                for request, _, _, future in batch:
+                    resolve(future, failed_analysis(request.frame_index, request.timestamp))
+                continue
             
-        except Exception as e:
-            logger.error(f"Frame analysis failed for {frame_path}: {e}")
-            # Return default response for failed analysis
-            return FrameAnalysisResponse(
-                frame_index=frame_index,
-                timestamp=timestamp,
-                has_product=False,
-                quality_score=0.0,
-                brightness_score=0.0,
-                blur_score=0.0,
-                detected_objects=[]
-            )
+            for (request, frame, key, future), result in zip(batch, results):
+                await self.post_q.put((request, frame, result, key, None, future))
+    
+    async def post_stage(self):
+        """Score frame quality and build the response"""
+        loop = asyncio.get_running_loop()
+        while True:
+            request, frame, result, key, detections, future = await self.post_q.get()
+            try:
+                response = await loop.run_in_executor(
+                    self.post_pool, self.service.build_response,
+                    frame, result, request.frame_index, request.timestamp, key, detections
+                )
+            except Exception as e:
+                logger.error(f"Frame analysis failed for {request.frame_path}: {e}")
+                response = failed_analysis(request.frame_index, request.timestamp)
+            
+            resolve(future, response)
+
+# Model replica held by each CPU worker process
+_worker_service = None
+
+def _init_worker(model_path: str, confidence_threshold: float, num_threads: int, cache_size: int):
+    """Load a model replica into a CPU worker process"""
+    global _worker_service
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(num_threads)
+    _worker_service = YOLOService(model_path, confidence_threshold, batch_size=1, cache_size=cache_size)
+
+def _analyze_one(request) -> FrameAnalysisResponse:
+    """Analyze a frame inside a CPU worker process"""
+    return _worker_service.analyze_request(request)
+
+def _worker_ready() -> bool:
+    """Probe run once per worker at startup; reaching it means the initializer loaded the model"""
+    return _worker_service is not None
 
 # FastAPI app
-app = FastAPI(title="YOLO Frame Analysis Service", version="1.0.0")
+app = FastAPI(
+    title="YOLO Frame Analysis Service",
+    version="1.0.0",
+    default_response_class=MsgspecJSONResponse
+)
 yolo_service = None
+pipeline = None
+cpu_pool = None
+# (max_workers, initargs) the CPU pool was started with, kept to restart it
+cpu_pool_settings = None
+# Why the CPU pool is gone for good, once a restart could not load the model
+cpu_pool_error = None
+cpu_pool_lock = asyncio.Lock()
+
+async def start_cpu_pool() -> ProcessPoolExecutor:
+    """Spawn the CPU inference workers and wait until each has loaded its model replica"""
+    cpu_workers, initargs = cpu_pool_settings
+    pool = ProcessPoolExecutor(
+        max_workers=cpu_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=initargs
+    )
+    
+    # Workers are spawned on demand, so one concurrent probe per worker starts them all;
+    # a failing initializer (bad model path, failed download) breaks the pool here
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(*(loop.run_in_executor(pool, _worker_ready) for _ in range(cpu_workers)))
+    except BrokenProcessPool as e:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise RuntimeError(f"CPU inference workers failed to load {initargs[0]}: {e}") from e
+    return pool
+
+async def restart_cpu_pool(broken: ProcessPoolExecutor):
+    """Replace a broken CPU pool, or retire it if fresh workers cannot load the model either"""
+    global cpu_pool, cpu_pool_error
+    # Concurrent requests all see the same broken pool, so only the first one replaces it
+    async with cpu_pool_lock:
+        if cpu_pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        try:
+            cpu_pool = await start_cpu_pool()
+        except RuntimeError as e:
+            logger.error(f"Not restarting the CPU worker pool again: {e}")
+            cpu_pool = None
+            cpu_pool_error = str(e)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize YOLO service on startup"""
-    global yolo_service
+    global yolo_service, pipeline, cpu_pool, cpu_pool_settings, cpu_pool_error
     model_path = os.getenv("YOLO_MODEL_PATH", "yolov8n.pt")
     confidence_threshold = float(os.getenv("YOLO_CONFIDENCE_THRESHOLD", "0.5"))
-    yolo_service = YOLOService(model_path, confidence_threshold)
+    batch_size = int(os.getenv("YOLO_BATCH_SIZE", "8"))
+    gpu_decode = os.getenv("YOLO_GPU_DECODE", "0") == "1"
+    pinned_upload = os.getenv("YOLO_PINNED_UPLOAD", "1") == "1"
+    # Near-duplicate reuse is opt-in: the 64-bit average hash can match frames from different videos
+    cache_size = int(os.getenv("YOLO_PHASH_CACHE_SIZE", "0"))
+    cuda_graphs = os.getenv("YOLO_CUDA_GRAPHS", "0") == "1"
+    
+    # On CPU, scale across cores with one model replica per worker process;
+    # the cores are shared with the other uvicorn workers. The replicas live
+    # only in the workers, so this process does not load a model of its own
+    cpu_count = max(1, (os.cpu_count() or 1) // server_workers())
+    cpu_workers = int(os.getenv("YOLO_CPU_WORKERS", str(max(1, cpu_count // 2))))
+    if not torch.cuda.is_available() and cpu_workers > 1:
+        logger.info(f"Starting {cpu_workers} CPU inference workers")
+        cpu_pool_settings = (
+            cpu_workers,
+            (model_path, confidence_threshold, max(1, cpu_count // cpu_workers), cache_size)
+        )
+        # Fails startup, as an in-process model load would, if the replicas cannot load
+        cpu_pool = await start_cpu_pool()
+        cpu_pool_error = None
+        return
+    
+    yolo_service = YOLOService(
+        model_path, confidence_threshold, batch_size, gpu_decode, pinned_upload, cache_size, cuda_graphs
+    )
+    pipeline = FramePipeline(
+        yolo_service,
+        reader_workers=int(os.getenv("YOLO_READER_WORKERS", "4")),
+        post_workers=int(os.getenv("YOLO_POST_WORKERS", "2")),
+        max_batch_size=int(os.getenv("YOLO_MAX_BATCH", str(batch_size))),
+        max_latency_ms=float(os.getenv("YOLO_MAX_LATENCY_MS", "5"))
+    )
+    pipeline.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the analysis pipeline and CPU workers"""
+    if pipeline is not None:
+        await pipeline.stop()
+    if cpu_pool is not None:
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+async def submit_frame(request) -> FrameAnalysisResponse:
+    """Hand a frame to the CPU worker pool if there is one, otherwise to the pipeline"""
+    if pipeline is not None:
+        return await pipeline.submit(request)
+    
+    pool = cpu_pool
+    if pool is None:
+        raise HTTPException(status_code=503, detail=f"CPU inference workers unavailable: {cpu_pool_error}")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, _analyze_one, request)
+    except BrokenProcessPool as e:
+        # A worker died (e.g. OOM-killed); every pending frame fails with it
+        logger.error(f"CPU worker pool broke, restarting it: {e}")
+        await restart_cpu_pool(pool)
+        if cpu_pool is None:
+            raise HTTPException(status_code=503, detail=f"CPU inference workers unavailable: {cpu_pool_error}")
+        return failed_analysis(request.frame_index, request.timestamp)
+
+def service_ready() -> bool:
+    """True once either the in-process model or a CPU worker pool with loaded replicas is up"""
+    return yolo_service is not None or cpu_pool is not None
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "model_loaded": yolo_service is not None}
+    if cpu_pool_error is not None:
+        raise HTTPException(status_code=503, detail=f"CPU inference workers unavailable: {cpu_pool_error}")
+    return {"status": "healthy", "model_loaded": service_ready()}
 
-@app.post("/analyze", response_model=FrameAnalysisResponse)
+@app.post("/analyze")
 async def analyze_frame(request: FrameAnalysisRequest):
     """Analyze a frame for product detection and quality"""
-    if yolo_service is None:
+    if not service_ready():
         raise HTTPException(status_code=503, detail="YOLO service not initialized")
     
     try:
-        result = yolo_service.analyze_frame(
-            request.frame_path,
-            request.frame_index,
-            request.timestamp
-        )
-        return result
+        return json_response(await submit_frame(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.post("/analyze_shm")
+async def analyze_shared_frame(request: SharedFrameRequest):
+    """Analyze a raw frame handed over in shared memory, skipping disk I/O and decode"""
+    if not service_ready():
+        raise HTTPException(status_code=503, detail="YOLO service not initialized")
+    
+    try:
+        return json_response(await submit_frame(request))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis failed: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
@@ -212,36 +1039,27 @@ async def analyze_frame(request: FrameAnalysisRequest):
 @app.post("/analyze_batch")
 async def analyze_batch(requests: List[FrameAnalysisRequest]):
     """Analyze multiple frames in batch"""
-    if yolo_service is None:
+    if not service_ready():
         raise HTTPException(status_code=503, detail="YOLO service not initialized")
     
-    results = []
-    for request in requests:
-        try:
-            result = yolo_service.analyze_frame(
-                request.frame_path,
-                request.frame_index,
-                request.timestamp
-            )
-            results.append(result)
-        except Exception as e:
-            logger.error(f"Batch analysis failed for frame {request.frame_index}: {e}")
-            # Add failed result
-            results.append(FrameAnalysisResponse(
-                frame_index=request.frame_index,
-                timestamp=request.timestamp,
-                has_product=False,
-                quality_score=0.0,
-                brightness_score=0.0,
-                blur_score=0.0,
-                detected_objects=[]
-            ))
-    
-    return results
+    # Frames are submitted together, so the pipeline batches them or the CPU workers share them
+    return json_response(await asyncio.gather(*(submit_frame(request) for request in requests)))
 
 if __name__ == "__main__":
     port = int(os.getenv("YOLO_SERVICE_PORT", "8000"))
     host = os.getenv("YOLO_SERVICE_HOST", "0.0.0.0")
     
-    logger.info(f"Starting YOLO service on {host}:{port}")
-    uvicorn.run(app, host=host, port=port, log_level="info")
+    workers = server_workers()
+    
+    logger.info(f"Starting YOLO service on {host}:{port} with {workers} workers")
+    # Multiple workers need the app as an import string
+    uvicorn.run(
+        "yolo_service:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        log_level="info"
+    )
@@ -69,9 +69,10 @@ export class S3Service {
         isPrimary
       });
 
-      // Read file for upload
-      const fileBuffer = fs.readFileSync(filePath);
-      const fileStats = fs.statSync(filePath);
+      // Read file for upload without blocking the event loop; the buffer length
+      // is the file size, so no separate stat call is needed
+      const fileBuffer = await fs.promises.readFile(filePath);
+      const fileSize = fileBuffer.length;
 
       // Upload to S3
       const command = new PutObjectCommand({
@@ -79,7 +80,7 @@ export class S3Service {
         Key: s3Key,
         Body: fileBuffer,
         ContentType: 'image/jpeg',
-        ContentLength: fileStats.size,
+        ContentLength: fileSize,
         CacheControl: 'max-age=31536000', // 1 year cache
         Metadata: {
           'video-id': videoId,
@@ -87,7 +88,7 @@ export class S3Service {
           'thumbnail-index': index.toString(),
           'is-primary': isPrimary.toString(),
           'generated-at': new Date().toISOString(),
-          'file-size': fileStats.size.toString()
+          'file-size': fileSize.toString()
         },
         ServerSideEncryption: 'AES256'
       });
@@ -100,7 +101,7 @@ export class S3Service {
       this.logger.info('Thumbnail uploaded successfully', {
         s3Key,
         s3Url,
-        fileSize: `${Math.round(fileStats.size / 1024)}KB`,
+        fileSize: `${Math.round(fileSize / 1024)}KB`,
         index,
         isPrimary
       });
@@ -135,19 +136,19 @@ export class S3Service {
     sellerHandle: string,
     videoId: string
   ): Promise<S3UploadResult[]> {
-    const results: S3UploadResult[] = [];
-
-    for (let i = 0; i < thumbnailPaths.length; i++) {
-      const isPrimary = i === 0; // First thumbnail is primary
-      const result = await this.uploadThumbnail(
-        thumbnailPaths[i],
-        sellerHandle,
-        videoId,
-        i,
-        isPrimary
-      );
-      results.push(result);
-    }
+    // Uploads are independent, so run them concurrently; uploadThumbnail never
+    // rejects and results keep the input order
+    const results = await Promise.all(
+      thumbnailPaths.map((thumbnailPath, i) =>
+        this.uploadThumbnail(
+          thumbnailPath,
+          sellerHandle,
+          videoId,
+          i,
+          i === 0 // First thumbnail is primary
+        )
+      )
+    );
 
     this.logger.info('Multiple thumbnails upload completed', {
       sellerHandle,
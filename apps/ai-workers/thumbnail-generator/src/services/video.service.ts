@@ -1,6 +1,8 @@
 import * as fs from 'fs';
 import * as path from 'path';
 import * as os from 'os';
+import * as http from 'http';
+import * as https from 'https';
 import { spawn } from 'child_process';
 import axios from 'axios';
 import sharp from 'sharp';
@@ -29,6 +31,13 @@ class Logger {
   }
 }
 
+// Shared keep-alive client for the YOLO service, so per-frame calls reuse
+// pooled connections instead of opening a new socket each time
+const yoloHttpClient = axios.create({
+  httpAgent: new http.Agent({ keepAlive: true, maxSockets: 8 }),
+  httpsAgent: new https.Agent({ keepAlive: true, maxSockets: 8 })
+});
+
 export class VideoService {
   private logger = new Logger('VideoService');
   private tempDir: string;
@@ -380,7 +389,7 @@ export class VideoService {
     const yoloServiceUrl = process.env.YOLO_SERVICE_URL || 'http://localhost:8000';
 
     try {
-      const response = await axios.post(`${yoloServiceUrl}/analyze`, {
+      const response = await yoloHttpClient.post(`${yoloServiceUrl}/analyze`, {
         frame_path: framePath,
         frame_index: frameIndex,
         timestamp: timestamp
@@ -535,8 +544,10 @@ export class VideoService {
         })
         .jpeg({
           quality: this.config.thumbnailQuality,
-          progressive: true,
-          mozjpeg: true // Better compression
+          chromaSubsampling: '4:2:0', // Chroma detail is invisible at thumbnail size
+          progressive: false,
+          optimiseCoding: false, // Skip the second Huffman pass; ~3% larger files
+          mozjpeg: false // Trellis quantisation costs several times the encode time
         })
         .toFile(thumbnailPath);
 
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# The service modules live in python/, which is not a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "python"))
+
+
+@pytest.fixture(scope="session")
+def textured_frame() -> np.ndarray:
+    """1080p BGR frame of 1/f noise, which has natural-image-like detail at every scale"""
+    rng = np.random.default_rng(0)
+    height, width = 1080, 1920
+    radius = np.hypot(np.fft.fftfreq(height)[:, None], np.fft.fftfreq(width)[None, :])
+    radius[0, 0] = 1.0
+    spectrum = (rng.normal(size=(height, width)) + 1j * rng.normal(size=(height, width))) / radius
+    gray = np.real(np.fft.ifft2(spectrum))
+    gray = np.clip((gray - gray.mean()) / gray.std() * 50 + 128, 0, 255).astype(np.uint8)
+    return np.repeat(gray[..., None], 3, axis=2)
@@ -0,0 +1,184 @@
+"""Tests for the command-line FrameAnalyzer"""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from yolo_analyzer import FrameAnalyzer
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "yolov8n.pt"
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return FrameAnalyzer(str(MODEL_PATH), 0.25, 0.5)
+
+
+@pytest.fixture
+def frame_path(tmp_path):
+    path = tmp_path / "frame.jpg"
+    image = np.random.default_rng(0).integers(0, 256, (360, 640, 3), dtype=np.uint8)
+    cv2.imwrite(str(path), image)
+    return str(path)
+
+
+def test_analyze_frames_fails_unreadable_frames_individually(analyzer, frame_path, tmp_path):
+    missing = str(tmp_path / "missing.jpg")
+    
+    results = analyzer.analyze_frames([frame_path, missing, frame_path])
+    
+    assert len(results) == 3
+    assert results[1]["error"] == f"Could not load image: {missing}"
+    assert "error" not in results[0] and "error" not in results[2]
+    assert results[0] == results[2]
+
+
+def test_analyze_frame_matches_batched_result(analyzer, frame_path):
+    assert analyzer.analyze_frame(frame_path) == analyzer.analyze_frames([frame_path])[0]
+
+
+def test_blurred_frame_scores_as_blurry(analyzer, textured_frame):
+    sharp = analyzer._calculate_quality_metrics(textured_frame)
+    blurred = analyzer._calculate_quality_metrics(cv2.GaussianBlur(textured_frame, (0, 0), 1.0))
+    
+    # blur_score is inverted here: 0 is sharp, 1 is fully blurred
+    assert sharp["blur_score"] == pytest.approx(0.0)
+    assert blurred["blur_score"] > 0.8
+
+
+def original_quality_metrics(image: np.ndarray) -> dict:
+    """The per-call NumPy quality metrics the OpenCV reductions replaced"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur_score_final = 1.0 - min(cv2.Laplacian(gray, cv2.CV_64F).var() / 1000.0, 1.0)
+    brightness = np.mean(gray) / 255.0
+    if brightness < 0.2:
+        brightness_score = brightness * 2.5
+    elif brightness > 0.8:
+        brightness_score = (1.0 - brightness) * 5
+    else:
+        brightness_score = 1.0
+    brightness_score = max(0.0, min(1.0, brightness_score))
+    contrast_score = min(gray.std() / 255.0 * 2, 1.0)
+    return {
+        'blur_score': blur_score_final,
+        'brightness_score': brightness_score,
+        'contrast_score': contrast_score,
+        'overall_quality': (1.0 - blur_score_final) * 0.4 + brightness_score * 0.3 + contrast_score * 0.3
+    }
+
+
+@pytest.mark.parametrize("gain, offset", [(1.0, 0), (0.2, 0), (0.3, 200), (0.05, 120)])
+def test_quality_metrics_match_original(analyzer, textured_frame, gain, offset):
+    # Textured, dark, bright and low-contrast variants of the same frame
+    image = cv2.convertScaleAbs(textured_frame, alpha=gain, beta=offset)
+    
+    metrics = analyzer._calculate_quality_metrics(image)
+    
+    assert metrics == pytest.approx(original_quality_metrics(image), abs=1e-6)
+
+
+def original_composition_score(detected_objects: list) -> float:
+    """The per-object composition loop the vectorized version replaced"""
+    if not detected_objects:
+        return 0.3
+    
+    composition_score = 0.0
+    max_confidence = 0.0
+    for obj in detected_objects:
+        bbox = obj['bbox']
+        confidence = obj['confidence']
+        distance_from_center = np.sqrt(
+            (bbox['x'] + bbox['width'] / 2 - 0.5) ** 2 + (bbox['y'] + bbox['height'] / 2 - 0.5) ** 2
+        )
+        center_score = 1.0 - min(distance_from_center * 2, 1.0)
+        obj_area = bbox['width'] * bbox['height']
+        if 0.1 <= obj_area <= 0.6:
+            size_score = 1.0
+        elif obj_area < 0.1:
+            size_score = obj_area * 10
+        else:
+            size_score = max(0.2, 1.0 - (obj_area - 0.6) * 2)
+        composition_score = max(composition_score, (center_score * 0.4 + size_score * 0.6) * confidence)
+        max_confidence = max(max_confidence, confidence)
+    
+    if max_confidence > 0.8:
+        composition_score *= 1.2
+    return min(composition_score, 1.0)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_composition_score_matches_original_loop(analyzer, seed):
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(0, 8))
+    corners = rng.uniform(0.0, 1.0, (count, 2, 2)).astype(np.float32)
+    xyxyn = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    confidences = rng.uniform(0.25, 1.0, count).astype(np.float32)
+    detected_objects = [
+        {'confidence': conf, 'bbox': {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}}
+        for conf, (x1, y1, x2, y2) in zip(confidences.tolist(), xyxyn.tolist())
+    ]
+    
+    score = analyzer._calculate_composition_score(xyxyn, confidences)
+    
+    assert score == pytest.approx(original_composition_score(detected_objects), abs=1e-6)
+
+
+def test_composition_score_size_band_edges(analyzer):
+    # Areas exactly on the 0.1 and 0.6 boundaries, centred, full confidence
+    for area in (0.1, 0.6):
+        side = np.sqrt(area)
+        xyxyn = np.array([[0.5 - side / 2, 0.5 - side / 2, 0.5 + side / 2, 0.5 + side / 2]])
+        detected_objects = [{'confidence': 1.0, 'bbox': {'x': xyxyn[0, 0], 'y': xyxyn[0, 1], 'width': side, 'height': side}}]
+        
+        score = analyzer._calculate_composition_score(xyxyn, np.array([1.0]))
+        
+        assert score == pytest.approx(original_composition_score(detected_objects))
+
+
+def fake_result(rows, shape=(64, 64)):
+    """A YOLO result holding the given (x1, y1, x2, y2, conf, cls) pixel-space rows"""
+    from types import SimpleNamespace
+    
+    from ultralytics.engine.results import Boxes
+    
+    return SimpleNamespace(boxes=Boxes(torch.tensor(rows, dtype=torch.float32).reshape(-1, 6), shape))
+
+
+def test_product_bitmap_matches_class_name_set(analyzer):
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    
+    for class_id, class_name in analyzer.model.names.items():
+        analysis = analyzer._build_analysis(image, fake_result([[8, 8, 32, 32, 0.9, class_id]]))
+        assert analysis['has_product'] == (class_name in analyzer.product_classes), class_name
+    
+    assert analyzer._build_analysis(image, fake_result([]))['has_product'] is False
+
+
+def original_detected_objects(model, result) -> list:
+    """The per-box tensor-indexing loop the bulk copies replaced"""
+    boxes = result.boxes
+    detected_objects = []
+    for i in range(len(boxes)):
+        class_id = int(boxes.cls[i])
+        x1, y1, x2, y2 = boxes.xyxyn[i].tolist()
+        detected_objects.append({
+            'class_name': model.names[class_id],
+            'confidence': float(boxes.conf[i]),
+            'bbox': {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}
+        })
+    return detected_objects
+
+
+def test_detection_unpacking_matches_per_box_loop(analyzer):
+    from ultralytics.utils import ASSETS
+    
+    image = cv2.imread(str(ASSETS / "bus.jpg"))
+    result = analyzer.model(image, conf=analyzer.confidence_threshold, verbose=False)[0]
+    assert len(result.boxes) > 1
+    
+    detected_objects = analyzer._build_analysis(image, result)['detected_objects']
+    
+    assert detected_objects == original_detected_objects(analyzer.model, result)
@@ -0,0 +1,504 @@
+"""Tests for the YOLO service helpers and its non-predictor inference paths"""
+
+import asyncio
+import os
+import shutil
+import signal
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+import torch
+from fastapi import HTTPException
+
+import yolo_service
+from yolo_service import (
+    MODEL_IMGSZ,
+    DetectionCache,
+    FrameAnalysisRequest,
+    FrameAnalysisResponse,
+    FramePipeline,
+    SharedFrameRequest,
+    YOLOService,
+    attach_shared_memory,
+    average_hash,
+    brightness_score_from_mean,
+    letterbox_cpu,
+)
+
+MODEL_PATH = Path(__file__).resolve().parents[1] / "yolov8n.pt"
+
+
+@pytest.fixture(scope="module")
+def service():
+    return YOLOService(str(MODEL_PATH), 0.25, batch_size=2)
+
+
+def branched_brightness_score(mean_brightness: float) -> float:
+    """The original three-way brightness scoring"""
+    if 0.3 <= mean_brightness <= 0.8:
+        brightness_score = 1.0
+    elif mean_brightness < 0.3:
+        brightness_score = mean_brightness / 0.3
+    else:
+        brightness_score = (1.0 - mean_brightness) / 0.2
+    return max(0.0, min(1.0, brightness_score))
+
+
+def test_brightness_score_matches_branched_version():
+    # Includes the 0.3 and 0.8 knees and values just either side of them
+    for mean_brightness in np.linspace(0.0, 1.0, 1001).tolist() + [0.2999, 0.3001, 0.7999, 0.8001]:
+        expected = branched_brightness_score(mean_brightness)
+        assert brightness_score_from_mean(mean_brightness) == pytest.approx(expected), mean_brightness
+
+
+def test_blurred_frame_scores_low(service, textured_frame):
+    blurred = cv2.GaussianBlur(textured_frame, (0, 0), 1.0)
+    
+    sharp_blur, _ = service.quality_metrics(textured_frame)
+    blurred_blur, _ = service.quality_metrics(blurred)
+    
+    assert sharp_blur == pytest.approx(1.0)
+    assert blurred_blur < 0.2
+
+
+def test_gpu_quality_metrics_match_cpu(service, textured_frame, monkeypatch):
+    # The GPU path's kernels run on CPU tensors too
+    monkeypatch.setattr(service, "gray_weights", torch.tensor([0.299, 0.587, 0.114]).view(3, 1, 1), raising=False)
+    kernel = torch.tensor([[0.0, 1.0, 0.0], [1.0, -4.0, 1.0], [0.0, 1.0, 0.0]]).view(1, 1, 3, 3)
+    monkeypatch.setattr(service, "laplacian_kernel", kernel, raising=False)
+    blurred = cv2.GaussianBlur(textured_frame, (0, 0), 1.0)
+    rgb = torch.from_numpy(blurred[..., ::-1].copy()).permute(2, 0, 1).float()
+    
+    blur_score, brightness_score = service._gpu_quality_metrics(rgb)
+    
+    assert blur_score < 0.2
+    assert (blur_score, brightness_score) == pytest.approx(service.quality_metrics(blurred), abs=0.02)
+
+
+class ReplayedForward:
+    """Stands in for a CUDA graph by re-running the network into the static output"""
+    
+    def __init__(self, net, static_input, static_output):
+        self.net = net
+        self.static_input = static_input
+        self.static_output = static_output
+    
+    def replay(self):
+        with torch.inference_mode():
+            self.static_output.copy_(self.net(self.static_input)[0])
+
+
+@pytest.fixture
+def letterboxed_batch():
+    from ultralytics.utils import ASSETS
+    
+    image = letterbox_cpu(cv2.imread(str(ASSETS / "bus.jpg")))
+    frame = torch.from_numpy(image[..., ::-1].copy()).permute(2, 0, 1).float() / 255.0
+    # Three frames against a graph captured for two: one full chunk, then one padded
+    return torch.stack([frame, frame.flip(-1), frame])
+
+
+def test_predict_graph_pads_and_chunks_batches(service, letterboxed_batch):
+    net = service.model.model
+    static_input = torch.zeros((service.batch_size, 3, MODEL_IMGSZ, MODEL_IMGSZ))
+    with torch.inference_mode():
+        static_output = net(static_input)[0].clone()
+    service.cuda_graph = (static_input, static_output, ReplayedForward(net, static_input, static_output), None)
+    
+    try:
+        results = service.predict_graph(letterboxed_batch)
+    finally:
+        service.cuda_graph = None
+    
+    expected = service.predictor(source=letterboxed_batch)
+    assert len(results) == 3
+    for result, reference in zip(results, expected):
+        assert len(result.boxes) > 0
+        assert torch.allclose(result.boxes.data, reference.boxes.data.cpu(), atol=1e-3)
+
+
+def test_load_model_captures_graph_before_serving(service, monkeypatch):
+    monkeypatch.setattr(YOLOService, "capture_graph", lambda self: "captured")
+    monkeypatch.setattr(service, "use_cuda_graphs", True)
+    monkeypatch.setattr(service, "model", None)
+    
+    try:
+        service.load_model()
+        assert service.cuda_graph == "captured"
+    finally:
+        service.cuda_graph = None
+
+
+@pytest.fixture
+def cpu_pool_app(monkeypatch):
+    """The app configured for two CPU worker processes, torn down after the test"""
+    for name in ("yolo_service", "pipeline", "cpu_pool", "cpu_pool_settings", "cpu_pool_error"):
+        monkeypatch.setattr(yolo_service, name, None)
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    monkeypatch.setenv("YOLO_MODEL_PATH", str(MODEL_PATH))
+    monkeypatch.setenv("YOLO_CPU_WORKERS", "2")
+    yield yolo_service
+    if yolo_service.cpu_pool is not None:
+        yolo_service.cpu_pool.shutdown(cancel_futures=True)
+
+
+def kill_workers(pool):
+    for process in list(pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+
+def bus_request():
+    from ultralytics.utils import ASSETS
+    
+    return FrameAnalysisRequest(frame_path=str(ASSETS / "bus.jpg"), frame_index=7, timestamp=1.5)
+
+
+def test_cpu_pool_startup_fails_when_model_cannot_load(cpu_pool_app, monkeypatch, tmp_path):
+    broken = tmp_path / "broken.pt"
+    broken.write_bytes(b"not a checkpoint")
+    monkeypatch.setenv("YOLO_MODEL_PATH", str(broken))
+    
+    with pytest.raises(RuntimeError, match="failed to load"):
+        asyncio.run(cpu_pool_app.startup_event())
+    assert not cpu_pool_app.service_ready()
+
+
+def test_cpu_pool_restarts_after_worker_dies(cpu_pool_app):
+    async def scenario():
+        await cpu_pool_app.startup_event()
+        assert cpu_pool_app.service_ready()
+        assert cpu_pool_app.yolo_service is None
+        
+        broken = cpu_pool_app.cpu_pool
+        kill_workers(broken)
+        failed = await cpu_pool_app.submit_frame(bus_request())
+        recovered = await cpu_pool_app.submit_frame(bus_request())
+        return broken, failed, recovered
+    
+    broken, failed, recovered = asyncio.run(scenario())
+    
+    assert cpu_pool_app.cpu_pool is not broken
+    assert failed.frame_index == 7 and failed.detected_objects == []
+    assert recovered.frame_index == 7 and recovered.detected_objects
+
+
+def test_cpu_pool_retired_when_restart_cannot_load_model(cpu_pool_app, tmp_path):
+    broken_weights = tmp_path / "broken.pt"
+    broken_weights.write_bytes(b"not a checkpoint")
+    
+    async def scenario():
+        await cpu_pool_app.startup_event()
+        # The weights go bad after startup, so the restarted workers cannot load them
+        workers, initargs = cpu_pool_app.cpu_pool_settings
+        cpu_pool_app.cpu_pool_settings = (workers, (str(broken_weights),) + initargs[1:])
+        kill_workers(cpu_pool_app.cpu_pool)
+        
+        with pytest.raises(HTTPException) as unavailable:
+            await cpu_pool_app.submit_frame(bus_request())
+        assert unavailable.value.status_code == 503
+        
+        # No further restarts: later requests fail fast and health reports the cause
+        with pytest.raises(HTTPException):
+            await cpu_pool_app.submit_frame(bus_request())
+        with pytest.raises(HTTPException) as health:
+            await cpu_pool_app.health_check()
+        assert "failed to load" in health.value.detail
+    
+    asyncio.run(scenario())
+    assert not cpu_pool_app.service_ready()
+
+
+class PipelineService:
+    """Records what FramePipeline asks of the service; frame paths select the failure to simulate"""
+    
+    batch_size = 4
+    
+    def __init__(self, fail_inference: bool = False):
+        self.fail_inference = fail_inference
+        self.batches = []
+    
+    def prepare_frame(self, request):
+        if request.frame_path == "unreadable":
+            raise ValueError("cannot decode")
+        if request.frame_path == "cached":
+            return request.frame_path, "key", (True, [])
+        return request.frame_path, None, None
+    
+    def predict(self, frames):
+        self.batches.append(list(frames))
+        if self.fail_inference:
+            raise RuntimeError("inference failed")
+        return [f"result:{frame}" for frame in frames]
+    
+    def build_response(self, frame, result, frame_index, timestamp, key=None, detections=None):
+        if frame == "unscorable":
+            raise ValueError("cannot score")
+        return FrameAnalysisResponse(
+            frame_index=frame_index,
+            timestamp=timestamp,
+            has_product=detections is not None,
+            quality_score=1.0,
+            brightness_score=1.0,
+            blur_score=1.0,
+            detected_objects=[]
+        )
+
+
+def run_pipeline(service, frame_paths, **options):
+    """Submit the frames together and return their responses"""
+    async def scenario():
+        pipeline = FramePipeline(service, **options)
+        pipeline.start()
+        try:
+            futures = [
+                pipeline.submit(FrameAnalysisRequest(frame_path=path, frame_index=i, timestamp=float(i)))
+                for i, path in enumerate(frame_paths)
+            ]
+            return await asyncio.wait_for(asyncio.gather(*futures), 5)
+        finally:
+            await pipeline.stop()
+    
+    return asyncio.run(scenario())
+
+
+def test_pipeline_fails_frames_individually():
+    service = PipelineService()
+    
+    responses = run_pipeline(service, ["a.jpg", "unreadable", "cached", "unscorable", "b.jpg"])
+    
+    assert [response.frame_index for response in responses] == [0, 1, 2, 3, 4]
+    assert [response.quality_score for response in responses] == [1.0, 0.0, 1.0, 0.0, 1.0]
+    # The cached frame reused its detections and never reached the model
+    assert responses[2].has_product
+    assert sorted(frame for batch in service.batches for frame in batch) == ["a.jpg", "b.jpg", "unscorable"]
+
+
+def test_micro_batches_are_bounded_by_max_batch_size():
+    service = PipelineService()
+    
+    responses = run_pipeline(service, [f"{i}.jpg" for i in range(10)], max_batch_size=3, max_latency_ms=50)
+    
+    sizes = [len(batch) for batch in service.batches]
+    assert len(responses) == 10 and sum(sizes) == 10
+    assert max(sizes) == 3
+    assert len(sizes) < 10  # concurrent frames were coalesced
+
+
+def test_micro_batch_size_is_capped_at_service_batch_size():
+    assert FramePipeline(PipelineService(), max_batch_size=64).max_batch_size == PipelineService.batch_size
+
+
+def test_lone_frame_is_dispatched_after_max_latency():
+    service = PipelineService()
+    
+    # run_pipeline times out after 5 s if the batcher waits for a full batch
+    responses = run_pipeline(service, ["a.jpg"], max_latency_ms=20)
+    
+    assert responses[0].quality_score == 1.0
+    assert service.batches == [["a.jpg"]]
+
+
+def test_inference_failure_fails_every_frame_of_the_batch():
+    service = PipelineService(fail_inference=True)
+    
+    responses = run_pipeline(service, ["a.jpg", "b.jpg", "c.jpg", "cached"], max_latency_ms=50)
+    
+    assert [response.quality_score for response in responses] == [0.0, 0.0, 0.0, 1.0]
+    assert [response.frame_index for response in responses] == [0, 1, 2, 3]
+
+
+def test_pipeline_keeps_serving_after_a_failed_batch():
+    service = PipelineService(fail_inference=True)
+    
+    async def scenario():
+        pipeline = FramePipeline(service, max_latency_ms=10)
+        pipeline.start()
+        try:
+            request = FrameAnalysisRequest(frame_path="a.jpg", frame_index=0, timestamp=0.0)
+            failed = await asyncio.wait_for(pipeline.submit(request), 5)
+            service.fail_inference = False
+            recovered = await asyncio.wait_for(pipeline.submit(request), 5)
+            return failed, recovered
+        finally:
+            await pipeline.stop()
+    
+    failed, recovered = asyncio.run(scenario())
+    assert failed.quality_score == 0.0
+    assert recovered.quality_score == 1.0
+
+
+def test_letterbox_cpu_pads_wide_frame():
+    image = np.full((360, 1280, 3), 200, dtype=np.uint8)
+    boxed = letterbox_cpu(image)
+    
+    assert boxed.shape == (MODEL_IMGSZ, MODEL_IMGSZ, 3)
+    # 1280x360 scales to 640x180, centred with 230 rows of padding above and below
+    assert (boxed[:230] == 114).all()
+    assert (boxed[410:] == 114).all()
+    assert (boxed[230:410] == 200).all()
+
+
+def test_letterbox_cpu_keeps_model_sized_frame():
+    image = np.random.default_rng(0).integers(0, 256, (MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8)
+    assert np.array_equal(letterbox_cpu(image), image)
+
+
+@pytest.mark.parametrize("shape", [(1080, 1920), (1920, 1080), (333, 517)])
+def test_letterbox_cpu_matches_ultralytics(shape):
+    from ultralytics.data.augment import LetterBox
+    
+    image = np.random.default_rng(0).integers(0, 256, shape + (3,), dtype=np.uint8)
+    expected = LetterBox((MODEL_IMGSZ, MODEL_IMGSZ), auto=False)(image=image)
+    
+    assert np.array_equal(letterbox_cpu(image), expected)
+
+
+def test_average_hash_of_uniform_thumbnail_is_zero():
+    assert average_hash(np.full((8, 8), 77, dtype=np.uint8)) == 0
+
+
+def test_average_hash_bit_order():
+    thumbnail = np.zeros((8, 8), dtype=np.uint8)
+    thumbnail[:4] = 255
+    # Row-major bits, first pixel most significant
+    assert average_hash(thumbnail) == 0xFFFFFFFF00000000
+    thumbnail[0, 0] = 0
+    assert average_hash(thumbnail) == 0x7FFFFFFF00000000
+
+
+def test_detection_cache_evicts_least_recently_used():
+    cache = DetectionCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_detection_cache_put_refreshes_existing_key():
+    cache = DetectionCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("a", 10)
+    cache.put("c", 3)
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+
+
+def test_near_duplicate_frame_reuses_detections(service, monkeypatch, tmp_path):
+    from ultralytics.utils import ASSETS
+    
+    assert service.detection_cache is None  # opt-in only
+    monkeypatch.setattr(service, "detection_cache", DetectionCache(8))
+    image = cv2.imread(str(ASSETS / "bus.jpg"))
+    cv2.imwrite(str(tmp_path / "first.png"), image)
+    cv2.imwrite(str(tmp_path / "second.png"), cv2.add(image, 2))
+    
+    first = service.analyze_request(FrameAnalysisRequest(frame_path=str(tmp_path / "first.png"), frame_index=0, timestamp=0.0))
+    monkeypatch.setattr(service, "predict", lambda frames: pytest.fail("cached frame reached the model"))
+    second = service.analyze_request(FrameAnalysisRequest(frame_path=str(tmp_path / "second.png"), frame_index=1, timestamp=0.5))
+    
+    assert first.detected_objects
+    assert second.detected_objects == first.detected_objects
+    assert second.frame_index == 1
+
+
+def test_attach_shared_memory_round_trip():
+    owner = shared_memory.SharedMemory(create=True, size=16)
+    try:
+        owner.buf[:4] = b"\x01\x02\x03\x04"
+        
+        attached = attach_shared_memory(owner.name)
+        assert bytes(attached.buf[:4]) == b"\x01\x02\x03\x04"
+        attached.buf[4] = 9
+        attached.close()
+        
+        # Detaching must leave the segment to its owner
+        assert owner.buf[4] == 9
+        shared_memory.SharedMemory(name=owner.name).close()
+    finally:
+        owner.close()
+        owner.unlink()
+
+
+def test_shared_memory_frame_matches_file_frame(service, tmp_path):
+    from ultralytics.utils import ASSETS
+    
+    image = cv2.imread(str(ASSETS / "bus.jpg"))
+    cv2.imwrite(str(tmp_path / "frame.png"), image)
+    offset = 64
+    owner = shared_memory.SharedMemory(create=True, size=offset + image.nbytes)
+    try:
+        np.ndarray(image.shape, dtype=np.uint8, buffer=owner.buf, offset=offset)[:] = image
+        shared = SharedFrameRequest(shm_name=owner.name, shape=list(image.shape), offset=offset, frame_index=3, timestamp=0.1)
+        
+        from_shm = service.analyze_request(shared)
+        from_file = service.analyze_request(FrameAnalysisRequest(frame_path=str(tmp_path / "frame.png"), frame_index=3, timestamp=0.1))
+    finally:
+        owner.close()
+        owner.unlink()
+    
+    assert from_shm.detected_objects
+    assert from_shm == from_file
+
+
+def test_shared_memory_frame_with_wrong_layout_fails(service):
+    request = SharedFrameRequest(shm_name="unused", shape=[480, 640], frame_index=4, timestamp=0.2)
+    
+    response = service.analyze_request(request)
+    
+    assert response.frame_index == 4 and response.quality_score == 0.0
+
+
+@pytest.fixture(scope="module")
+def onnx_service(tmp_path_factory):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    weights = tmp_path_factory.mktemp("onnx") / MODEL_PATH.name
+    shutil.copyfile(MODEL_PATH, weights)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("YOLO_BACKEND", "onnx")
+        return YOLOService(str(weights), 0.25)
+
+
+def test_onnx_detections_match_pytorch(service, onnx_service):
+    assert onnx_service.backend == "onnx"
+    request = bus_request()
+    
+    # Marginal detections near the 0.25 threshold may flip between the two letterboxings
+    confident = lambda response: [obj for obj in response.detected_objects if obj.confidence > 0.5]
+    expected = confident(service.analyze_request(request))
+    detected = confident(onnx_service.analyze_request(request))
+    
+    # Square vs. minimal-rectangle letterboxing moves boxes slightly; unscaled
+    # (model-input) coordinates would be off by hundreds of pixels on this 810x1080 frame
+    assert len(detected) >= 3
+    key = lambda obj: (obj.class_name, obj.bbox[0])
+    assert [obj.class_name for obj in sorted(detected, key=key)] == [obj.class_name for obj in sorted(expected, key=key)]
+    for obj, ref in zip(sorted(detected, key=key), sorted(expected, key=key)):
+        assert obj.bbox == pytest.approx(ref.bbox, abs=32.0)
+
+
+def test_onnx_boxes_are_scaled_to_the_original_frame(onnx_service):
+    image = np.full((360, 1280, 3), 114, dtype=np.uint8)
+    result = onnx_service.predictor(source=[image])[0]
+    assert result.boxes.orig_shape == (360, 1280)
+
+
+def test_unusable_onnx_model_falls_back_to_pytorch(monkeypatch, tmp_path):
+    pytest.importorskip("onnxruntime")
+    broken = tmp_path / "broken.onnx"
+    broken.write_bytes(b"not a model")
+    monkeypatch.setenv("YOLO_BACKEND", "onnx")
+    monkeypatch.setattr(YOLOService, "onnx_model_path", lambda self: str(broken))
+    
+    fallback = YOLOService(str(MODEL_PATH), 0.25)
+    
+    assert fallback.backend == "pytorch"
+    assert fallback.analyze_request(bus_request()).detected_objects